@@ -1,7 +1,8 @@
+import math
+
 import streamlit as st
 import pandas as pd
 import numpy as np
-import statsmodels.api as sm
 import plotly.graph_objects as go
 
 # -----------------------------------------------------------------------------
@@ -9,16 +10,40 @@ import plotly.graph_objects as go
 # -----------------------------------------------------------------------------
 st.set_page_config(page_title="Production Dashboard", layout="wide")
 
-st.markdown("""
+# 스타일시트는 모듈 상수로 두고 st.html로 전송: <style>만 있는 내용은 본문이 아닌 이벤트 컨테이너로 들어가
+# 마크다운 파싱 없이 적용되고, 본문에 빈 블록(여백)도 생기지 않음
+CUSTOM_CSS = """
 <style>
     /* 기본(PC) 스타일 */
-    div[data-testid="metric-container"] {
+    .kpi-row {
+        display: flex;
+        flex-wrap: wrap;
+        gap: 1rem;
+    }
+    .kpi-card {
+        flex: 1 1 0;
+        min-width: 180px;
         background-color: #ffffff;
         border: 1px solid #e0e0e0;
         padding: 15px;
         border-radius: 10px;
         box-shadow: 0 4px 6px rgba(0,0,0,0.05);
     }
+    .kpi-label {
+        font-size: 0.875rem;
+        color: rgba(49, 51, 63, 0.6);
+    }
+    .kpi-value {
+        font-size: 2.25rem;
+        line-height: 1.4;
+        color: rgb(49, 51, 63);
+    }
+    .kpi-delta {
+        font-size: 0.875rem;
+    }
+    .kpi-delta.up { color: #09ab3b; }
+    .kpi-delta.down { color: #ff2b2b; }
+    .kpi-delta.off { color: rgba(49, 51, 63, 0.6); }
     .stApp {
         background-color: #f8f9fa;
     }
@@ -34,8 +59,9 @@ st.markdown("""
         h1 {
             font-size: 1.8rem !important;
         }
-        /* 3. KPI 박스 간의 간격 확보 */
-        div[data-testid="metric-container"] {
+        /* 3. KPI 박스를 세로로 쌓고 간격 확보 */
+        .kpi-card {
+            flex-basis: 100%;
             margin-bottom: 10px;
         }
         /* 4. 그래프 간격 확보 */
@@ -44,32 +70,108 @@ st.markdown("""
         }
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.html(CUSTOM_CSS)
+
+# 차트 스타일 중 값과 무관한 부분은 모듈 상수로 두고, 차트를 만들 때 값만 병합
+# 레이아웃은 빈 'none' 템플릿 사용: 기본 'plotly' 템플릿(차트마다 ~3.6KB)을 매번 전송하지 않고,
+# 색/폰트는 Streamlit 테마가 프론트엔드에서 템플릿 위에 채움 (여백/배경은 테마가 덮어쓰므로 레이아웃에 직접 지정)
+GAUGE_BASE = {
+    'bar': {'color': "#2ecc71"},
+    'bgcolor': "white",
+}
+GAUGE_NUMBER = {'suffix': " 톤", 'font': {'size': 24, 'color': '#2c3e50'}}
+GAUGE_THRESHOLD_LINE = {'color': "red", 'width': 4}
+# 모바일 높이 최적화 (250px)
+GAUGE_LAYOUT = dict(template='none', height=250, margin=dict(l=20, r=20, t=30, b=20), paper_bgcolor='rgba(0,0,0,0)')
+
+BAR_LAYOUT = dict(
+    template='none',
+    height=250,
+    margin=dict(l=20, r=20, t=30, b=20),
+    xaxis=dict(title="Production (Tons)"),
+    plot_bgcolor='rgba(0,0,0,0)',
+    yaxis=dict(showticklabels=False),
+    hoverlabel=dict(bgcolor="white", font_size=14)
+)
+
+BULLET_BASE = {
+    'shape': "bullet",
+    'bar': {'color': "#34495e"},
+    'bgcolor': "white",
+}
+BULLET_TITLE_FONT = {'size': 15, 'color': 'gray'}
+BULLET_NUMBER = {'font': {'size': 20, 'color': '#2c3e50'}}
+BULLET_THRESHOLD_LINE = {'color': "#e74c3c", 'width': 3}
+BULLET_LAYOUT = dict(template='none', height=280, margin=dict(l=10, r=10, t=10, b=10), paper_bgcolor='rgba(0,0,0,0)')
+# 진단 지표: (컬럼, 제목, 눈금 최대값) - 순서는 사이드바 입력 순서와 같음
+BULLET_SPECS = (
+    ('yield', '수율 (%)', 100),
+    ('productivity', '생산성', 2.5),
+    ('workforce', '인원 (명)', 70),
+    ('hour', '작업시간 (h)', 220)
+)
+
+# 계기판/진단 지표는 보기 전용 → 정적 렌더링 (hover/줌 이벤트와 모드바 생성 생략). 막대 차트는 툴팁 때문에 제외
+STATIC_CHART_CONFIG = {'staticPlot': True, 'displayModeBar': False}
 
 # -----------------------------------------------------------------------------
 # 2. 데이터 및 모델링
 # -----------------------------------------------------------------------------
-# (1) 데이터 준비
-np.random.seed(123)
-n = 30
-df = pd.DataFrame({
-    'production': np.random.normal(100, 10, n),
-    'yield': np.random.uniform(80, 95, n),
-    'productivity': np.random.uniform(1.0, 2.0, n),
-    'workforce': np.random.choice(range(40, 61), n),
-    'hour': np.random.choice(range(160, 201), n)
-})
-
-# (2) 전처리 & 모델링
-drop_indices = [16, 19, 22]
-df_clean = df.drop(drop_indices, errors='ignore').reset_index(drop=True)
-
-X = df_clean[['yield', 'productivity', 'workforce', 'hour']]
-y = df_clean['production']
-X = sm.add_constant(X)
-model = sm.OLS(y, X).fit()
-
-means = df_clean.mean()
+# (1) 데이터 준비 - 시연용 데이터는 항상 같으므로 한 번만 생성 (PCG64 Generator 사용, 실수 컬럼은 float32로 보관)
+@st.cache_data
+def make_data():
+    rng = np.random.default_rng(123)
+    n = 30
+    df = pd.DataFrame({
+        'production': rng.normal(100, 10, n).astype(np.float32),
+        'yield': rng.uniform(80, 95, n).astype(np.float32),
+        'productivity': rng.uniform(1.0, 2.0, n).astype(np.float32),
+        'workforce': rng.integers(40, 61, n),
+        'hour': rng.integers(160, 201, n)
+    })
+
+    drop_indices = [16, 19, 22]
+    mask = np.ones(n, dtype=bool)
+    mask[drop_indices] = False
+    return df.iloc[mask].reset_index(drop=True)
+
+# (2) 모델링 - OLS 적합은 입력과 무관하므로 프로세스당 한 번만 수행 (슬라이더 조작 시 재적합 방지)
+@st.cache_resource
+def build_model():
+    # scipy는 t 분위수 계산에만 필요하므로 캐시된 함수 안에서 import (콜드 스타트 시간 단축)
+    from scipy import stats
+
+    df_clean = make_data()
+
+    # 설계행렬은 C-contiguous float64 ndarray로 한 번만 만들어 적합에 사용 (적합 정밀도는 float64 유지)
+    X = np.ascontiguousarray(df_clean[['yield', 'productivity', 'workforce', 'hour']].values, dtype=np.float64)
+    X = np.column_stack([np.ones(len(X)), X])
+    y = df_clean['production'].to_numpy(dtype=np.float64)
+
+    # OLS 적합 - LAPACK lstsq 한 번으로 β를 구하고, 예측 구간 계산용 (X'X)^-1 과 σ² 만 보관
+    beta, *_ = np.linalg.lstsq(X, y, rcond=None)
+    XtX_inv = np.linalg.inv(X.T @ X)
+    resid = y - X @ beta
+    df_resid = len(y) - X.shape[1]
+    scale = float(resid @ resid) / df_resid
+    return {
+        'means': df_clean.mean().to_dict(),
+        'beta': beta,
+        'cov': scale * XtX_inv,
+        'scale': scale,
+        'tcrit': float(stats.t.ppf(0.975, df_resid)),
+        'rsquared': 1.0 - float(resid @ resid) / float(((y - y.mean()) ** 2).sum()),
+    }
+
+# 관측값 95% 예측 구간: x·β ± t * sqrt(σ² + x·Cov(β)·x) - 5차원 고정 크기라 스칼라 연산으로 처리
+def predict_interval(x, beta, cov, scale, tcrit):
+    mean = float(x.dot(beta))
+    se = math.sqrt(scale + float(x.dot(cov.dot(x))))
+    return mean - tcrit * se, mean, mean + tcrit * se
+
+fit = build_model()
+means = fit['means']
 
 # -----------------------------------------------------------------------------
 # 3. 사이드바 (모바일에서는 접혀있음)
@@ -78,14 +180,7 @@ with st.sidebar:
     st.header("🎛️ 시뮬레이션 설정")
     st.info("모바일에서는 왼쪽 상단 화살표(>)를 눌러 설정을 변경하세요.") # 모바일 안내 문구 추가
     st.markdown("---")
-    
-    input_yield = st.slider("수율 (Yield, %)", 80.0, 95.0, 88.0, step=0.1)
-    input_prod = st.slider("생산성 (Productivity)", 1.0, 2.0, 1.5, step=0.1)
-    input_wf = st.slider("투입 인원 (Workforce)", 40, 60, 50, step=1)
-    input_hour = st.slider("작업 시간 (Hour)", 160, 200, 180, step=1)
-    
-    st.markdown("---")
-    st.caption(f"Model Accuracy ($R^2$): **{model.rsquared:.2f}**")
+    # 입력 폼과 모델 정확도는 아래 대시보드 fragment 안에서 사이드바에 그림
 
 # -----------------------------------------------------------------------------
 # 4. 메인 대시보드
@@ -94,111 +189,153 @@ st.title("🏭 생산 실적 예측")
 st.markdown("**AI-driven Production Forecasting**")
 st.caption("👈 왼쪽 사이드바를 열어 조건을 입력하세요.") # 모바일 사용자를 위한 힌트
 
-# (1) 예측 계산
-input_data = pd.DataFrame({'const': 1.0, 'yield': [input_yield], 'productivity': [input_prod], 'workforce': [input_wf], 'hour': [input_hour]})
-predictions = model.get_prediction(input_data)
-pred_df = predictions.summary_frame(alpha=0.05)
-
-pred_val = pred_df['mean'][0]
-lower_val = pred_df['obs_ci_lower'][0]
-upper_val = pred_df['obs_ci_upper'][0]
-
-st.divider()
+# st.metric 4개 대신 HTML 카드 4개를 markdown 한 번으로 전송 (st.metric과 같은 모양: 라벨/값/증감)
+def kpi_card(label, value, delta=None, delta_color="normal"):
+    html = f'<div class="kpi-card"><div class="kpi-label">{label}</div><div class="kpi-value">{value}</div>'
+    if delta is not None:
+        direction = "down" if delta.startswith("-") else "up"
+        arrow = "▼" if direction == "down" else "▲"
+        html += f'<div class="kpi-delta {direction if delta_color == "normal" else "off"}">{arrow} {delta.lstrip("+- ")}</div>'
+    return html + '</div>'
 
-# --- SECTION 1: 핵심 KPI (모바일에서는 자동 세로 정렬됨) ---
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric("예측 생산량 (Target)", f"{pred_val:.1f} 톤", delta=f"{pred_val - means['production']:.1f} vs Avg")
-with col2:
-    st.metric("최소 보장 (Risk Min)", f"{lower_val:.1f} 톤", delta="- Conservative", delta_color="off")
-with col3:
-    st.metric("최대 가능 (Max)", f"{upper_val:.1f} 톤", delta="+ Optimistic", delta_color="off")
-with col4:
-    achievement = (pred_val / 100) * 100
-    st.metric("목표 달성률 (Ref. 100t)", f"{achievement:.1f}%")
-
-st.markdown("") # 여백
-
-# --- SECTION 2: 메인 차트 ---
-# 모바일에서 그래프가 너무 작아지지 않도록 컬럼 비율 조정 안함 (1:1 자동)
-c_left, c_right = st.columns(2)
-
-with c_left:
-    st.subheader("🎯 예측 계기판")
+# 계기판/막대 차트 골격(스타일)은 세션당 한 번만 만들고, 재실행 시에는 값이 바뀌는 속성만 갱신
+# (세션마다 자기 Figure를 갖기 때문에 제자리 수정해도 다른 세션과 충돌하지 않음)
+def build_gauge_skeleton():
     fig_gauge = go.Figure(go.Indicator(
         mode = "gauge+number",
-        value = pred_val,
         domain = {'x': [0, 1], 'y': [0, 1]},
-        number = {'suffix': " 톤", 'font': {'size': 24, 'color': '#2c3e50'}},
+        number = GAUGE_NUMBER,
         gauge = {
-            'axis': {'range': [lower_val*0.8, upper_val*1.1], 'tickwidth': 1},
-            'bar': {'color': "#2ecc71"},
-            'bgcolor': "white",
-            'steps': [
-                {'range': [lower_val*0.8, lower_val], 'color': '#ffcdd2'},
-                {'range': [lower_val, upper_val], 'color': '#f1f8e9'}
-            ],
-            'threshold': {'line': {'color': "red", 'width': 4}, 'thickness': 0.75, 'value': pred_val}
+            **GAUGE_BASE,
+            'axis': {'tickwidth': 1},
+            'steps': [{'color': '#ffcdd2'}, {'color': '#f1f8e9'}],
+            'threshold': {'line': GAUGE_THRESHOLD_LINE, 'thickness': 0.75}
         }
     ))
-    # 모바일 높이 최적화 (250px)
-    fig_gauge.update_layout(height=250, margin=dict(l=20, r=20, t=30, b=20), paper_bgcolor='rgba(0,0,0,0)')
-    st.plotly_chart(fig_gauge, use_container_width=True)
+    fig_gauge.update_layout(**GAUGE_LAYOUT)
+    return fig_gauge
 
-with c_right:
-    st.subheader("📊 예측 범위 상세")
+def build_bar_skeleton():
     fig_bar = go.Figure()
     fig_bar.add_trace(go.Bar(
-        y=['생산량'], x=[pred_val],
+        y=['생산량'],
         orientation='h',
         marker_color='#3498db',
-        error_x=dict(type='data', array=[upper_val-pred_val], arrayminus=[pred_val-lower_val], color='#e74c3c', width=6),
-        text=[f"{pred_val:.1f} 톤"], 
-        textposition='auto',
-        hovertemplate='<b>예측값:</b> %{x:.1f} 톤<br>' +
-                      '<b>안전 범위:</b> ±' + f"{(upper_val-lower_val)/2:.1f} 톤" + 
-                      '<extra></extra>' 
+        error_x=dict(type='data', color='#e74c3c', width=6),
+        textposition='auto'
     ))
-    fig_bar.update_layout(
-        height=250,
-        margin=dict(l=20, r=20, t=30, b=20),
-        xaxis=dict(title="Production (Tons)", range=[lower_val*0.8, upper_val*1.1]),
-        plot_bgcolor='rgba(0,0,0,0)',
-        yaxis=dict(showticklabels=False),
-        hoverlabel=dict(bgcolor="white", font_size=14)
-    )
-    st.plotly_chart(fig_bar, use_container_width=True)
-
-# --- SECTION 3: 투입 변수 진단 ---
-st.subheader("🔍 투입 변수 진단")
-st.caption("진한 막대(현재) vs 연한 막대(평균)")
-
-# 모바일에서는 4개가 세로로 자동 정렬됩니다.
-cols = st.columns(4)
-vars_config = [
-    ('yield', '수율 (%)', input_yield, means['yield'], 100),
-    ('productivity', '생산성', input_prod, means['productivity'], 2.5),
-    ('workforce', '인원 (명)', input_wf, means['workforce'], 70),
-    ('hour', '작업시간 (h)', input_hour, means['hour'], 220)
-]
-
-for i, (col_name, title, curr, avg, max_range) in enumerate(vars_config):
-    with cols[i]:
-        fig_bullet = go.Figure(go.Indicator(
+    fig_bar.update_layout(**BAR_LAYOUT)
+    return fig_bar
+
+# 4개 지표를 차트 4개 대신 Figure 하나에 세로로 쌓아 한 번에 전송 (PC/모바일 모두 같은 배치)
+# 평균/눈금 범위는 고정이므로 골격에 넣어 두고, 재실행 시에는 현재값(value)만 갱신
+def build_bullet_skeleton():
+    fig_bullet = go.Figure()
+    for i, (col_name, title, max_range) in enumerate(BULLET_SPECS):
+        avg = means[col_name]
+        fig_bullet.add_trace(go.Indicator(
             mode = "number+gauge",
-            value = curr,
-            domain = {'x': [0.1, 1], 'y': [0, 1]},
-            title = {'text': title, 'font': {'size': 15, 'color': 'gray'}},
-            number = {'font': {'size': 20, 'color': '#2c3e50'}},
+            domain = {'x': [0.2, 1], 'y': [1 - (i+1)/4 + 0.04, 1 - i/4 - 0.04]},
+            title = {'text': title, 'font': BULLET_TITLE_FONT},
+            number = BULLET_NUMBER,
             gauge = {
-                'shape': "bullet",
+                **BULLET_BASE,
                 'axis': {'range': [None, max_range]},
-                'bar': {'color': "#34495e"},
-                'bgcolor': "white",
                 'steps': [{'range': [0, avg], 'color': "#ecf0f1"}],
-                'threshold': {'line': {'color': "#e74c3c", 'width': 3}, 'thickness': 0.75, 'value': avg}
+                'threshold': {'line': BULLET_THRESHOLD_LINE, 'thickness': 0.75, 'value': avg}
             }
         ))
-        fig_bullet.update_layout(height=120, margin=dict(l=10, r=10, t=10, b=10), paper_bgcolor='rgba(0,0,0,0)')
-        st.plotly_chart(fig_bullet, use_container_width=True)
+    fig_bullet.update_layout(**BULLET_LAYOUT)
+    return fig_bullet
+
+# 입력 폼 ~ 차트를 fragment로 묶어, '예측 실행'을 눌러도 이 함수만 다시 실행
+# (페이지 설정/CSS/제목/모델 캐시 조회 등 위쪽 스크립트는 건너뜀)
+@st.fragment
+def render_dashboard():
+    with st.sidebar:
+        # 슬라이더를 폼으로 묶어 드래그 중에는 재실행하지 않고, 버튼을 누를 때 한 번만 재실행
+        with st.form("inputs"):
+            input_yield = st.slider("수율 (Yield, %)", 80.0, 95.0, 88.0, step=0.1)
+            input_prod = st.slider("생산성 (Productivity)", 1.0, 2.0, 1.5, step=0.1)
+            input_wf = st.slider("투입 인원 (Workforce)", 40, 60, 50, step=1)
+            input_hour = st.slider("작업 시간 (Hour)", 160, 200, 180, step=1)
+            st.form_submit_button("예측 실행")
+
+        st.markdown("---")
+        st.caption(f"Model Accuracy ($R^2$): **{fit['rsquared']:.2f}**")
+
+    # (1) 예측 계산 - 입력이 직전 실행과 같으면 (입력 외의 이유로 재실행된 경우) 이전 결과 재사용
+    # 실수 슬라이더 값은 부동소수 오차(88.10000000000001 등)가 생길 수 있어 슬라이더 단위로 맞춘 뒤 비교
+    input_key = (round(input_yield, 1), round(input_prod, 1), int(input_wf), int(input_hour))
+    if st.session_state.get('last_key') != input_key:
+        x = np.array((1.0,) + input_key, dtype=np.float64)
+        st.session_state['last_pred'] = predict_interval(x, fit['beta'], fit['cov'], fit['scale'], fit['tcrit'])
+        st.session_state['last_key'] = input_key
+    lower_val, pred_val, upper_val = st.session_state['last_pred']
+
+    st.divider()
+
+    # --- SECTION 1: 핵심 KPI (모바일에서는 자동 세로 정렬됨) ---
+    achievement = (pred_val / 100) * 100
+    st.markdown('<div class="kpi-row">' +
+                kpi_card("예측 생산량 (Target)", f"{pred_val:.1f} 톤", delta=f"{pred_val - means['production']:.1f} vs Avg") +
+                kpi_card("최소 보장 (Risk Min)", f"{lower_val:.1f} 톤", delta="- Conservative", delta_color="off") +
+                kpi_card("최대 가능 (Max)", f"{upper_val:.1f} 톤", delta="+ Optimistic", delta_color="off") +
+                kpi_card("목표 달성률 (Ref. 100t)", f"{achievement:.1f}%") +
+                '</div>', unsafe_allow_html=True)
+
+    st.markdown("") # 여백
+
+    # --- SECTION 2: 메인 차트 ---
+    # 모바일에서 그래프가 너무 작아지지 않도록 컬럼 비율 조정 안함 (1:1 자동)
+    c_left, c_right = st.columns(2)
+
+    if 'fig_gauge' not in st.session_state:
+        st.session_state['fig_gauge'] = build_gauge_skeleton()
+        st.session_state['fig_bar'] = build_bar_skeleton()
+        st.session_state['fig_bullet'] = build_bullet_skeleton()
+        st.session_state['fig_key'] = None
+    fig_gauge = st.session_state['fig_gauge']
+    fig_bar = st.session_state['fig_bar']
+    fig_bullet = st.session_state['fig_bullet']
+
+    # 입력이 바뀌었을 때만 값 갱신
+    if st.session_state['fig_key'] != input_key:
+        gauge = fig_gauge.data[0]
+        gauge.value = pred_val
+        gauge.gauge.axis.range = [lower_val*0.8, upper_val*1.1]
+        gauge.gauge.steps[0].range = [lower_val*0.8, lower_val]
+        gauge.gauge.steps[1].range = [lower_val, upper_val]
+        gauge.gauge.threshold.value = pred_val
+
+        bar = fig_bar.data[0]
+        # 수치 배열은 ndarray로 넘겨 Plotly가 base64 typed array로 직렬화하게 함
+        bar.x = np.array([pred_val])
+        bar.error_x.array = np.array([upper_val-pred_val])
+        bar.error_x.arrayminus = np.array([pred_val-lower_val])
+        bar.text = [f"{pred_val:.1f} 톤"]
+        bar.hovertemplate = ('<b>예측값:</b> %{x:.1f} 톤<br>' +
+                             '<b>안전 범위:</b> ±' + f"{(upper_val-lower_val)/2:.1f} 톤" +
+                             '<extra></extra>')
+        fig_bar.layout.xaxis.range = [lower_val*0.8, upper_val*1.1]
+
+        # 진단 지표 트레이스 순서 = 입력 순서 (수율, 생산성, 인원, 작업시간)
+        for trace, curr in zip(fig_bullet.data, input_key):
+            trace.value = curr
+        st.session_state['fig_key'] = input_key
+
+    with c_left:
+        st.subheader("🎯 예측 계기판")
+        st.plotly_chart(fig_gauge, config=STATIC_CHART_CONFIG)
+
+    with c_right:
+        st.subheader("📊 예측 범위 상세")
+        st.plotly_chart(fig_bar)
+
+    # --- SECTION 3: 투입 변수 진단 ---
+    st.subheader("🔍 투입 변수 진단")
+    st.caption("진한 막대(현재) vs 연한 막대(평균)")
+
+    st.plotly_chart(fig_bullet, config=STATIC_CHART_CONFIG)
+
+render_dashboard()